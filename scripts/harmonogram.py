@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Harmonogram zadań uwzględniający ich rozmiar (LPT - najdłuższe najpierw).
+Koszt zadania szacowany jest liniowo z jednej cechy (np. liczby stron PDF
+lub rozmiaru tekstu dokumentów), a współczynniki modelu są dopasowywane
+do czasów z poprzednich uruchomień zapisanych w pliku historii.
+Historia zapisywana jest po każdym zadaniu, więc przerwana partia
+nie traci pomiarów.
+"""
+
+import heapq
+import json
+import os
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Callable
+
+PLIK_HISTORII = Path("./.historia_czasow.json")
+MAX_PROBEK = 500  # Liczba ostatnich pomiarów przechowywanych dla każdej cechy
+
+
+def dopasuj_model(probki: list, domyslny: tuple[float, float]) -> tuple[float, float]:
+    """
+    Dopasowuje model czas = a + b * x metodą najmniejszych kwadratów.
+    Przy zbyt małej liczbie próbek zwraca model domyślny (lub go skaluje).
+    """
+    if not probki:
+        return domyslny
+
+    n = len(probki)
+    sr_x = sum(x for x, _ in probki) / n
+    sr_t = sum(t for _, t in probki) / n
+    wariancja = sum((x - sr_x) ** 2 for x, _ in probki)
+
+    if n < 2 or wariancja == 0:
+        # Jedna "kolumna" danych - zachowujemy nachylenie, korygujemy wyraz wolny
+        a, b = domyslny
+        return max(0.0, sr_t - b * sr_x), b
+
+    b = sum((x - sr_x) * (t - sr_t) for x, t in probki) / wariancja
+    b = max(0.0, b)
+    a = max(0.0, sr_t - b * sr_x)
+    return a, b
+
+
+def formatuj_czas(sekundy: float) -> str:
+    """Formatuje czas w sekundach jako 'Xh Ym', 'Ym Zs' lub 'Zs'."""
+    sekundy = int(round(sekundy))
+    if sekundy >= 3600:
+        return f"{sekundy // 3600}h {sekundy % 3600 // 60}m"
+    if sekundy >= 60:
+        return f"{sekundy // 60}m {sekundy % 60}s"
+    return f"{sekundy}s"
+
+
+class Harmonogram:
+    """
+    Porządkuje zadania od najdroższych (LPT) i na bieżąco szacuje czas
+    do końca partii na podstawie modelu kosztu uczonego z historii.
+
+    Zadania to słowniki; cecha zadania odczytywana jest funkcją `cecha_zadania`.
+    """
+
+    def __init__(
+        self,
+        cecha: str,
+        cecha_zadania: Callable[[dict], float],
+        domyslny: tuple[float, float],
+        liczba_workerow: int,
+        plik_historii: Path = PLIK_HISTORII,
+    ):
+        self.cecha = cecha
+        self.cecha_zadania = cecha_zadania
+        self.domyslny = domyslny
+        self.liczba_workerow = liczba_workerow
+        self.plik_historii = plik_historii
+
+        self._lock = Lock()
+        self._lock_pliku = Lock()
+        self._historia = self._wczytaj_historie()
+        self._model = dopasuj_model(self._historia.get(cecha, []), domyslny)
+        self._niezapisane: list[list[float]] = []
+        self._oczekujace: dict[int, dict] = {}
+        self._w_toku: dict[int, dict] = {}
+
+    def _wczytaj_historie(self) -> dict:
+        try:
+            with open(self.plik_historii, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def zapisz_historie(self):
+        """
+        Dopisuje nowe pomiary do pliku historii. Plik jest najpierw wczytywany
+        ponownie, aby nie nadpisać pomiarów innego skryptu działającego
+        równolegle, a następnie atomowo podmieniany.
+        """
+        with self._lock_pliku:
+            with self._lock:
+                nowe, self._niezapisane = self._niezapisane, []
+            if not nowe:
+                return
+
+            historia = self._wczytaj_historie()
+            probki = historia.setdefault(self.cecha, [])
+            probki.extend(nowe)
+            del probki[:-MAX_PROBEK]
+
+            sciezka_tmp = f"{self.plik_historii}.{os.getpid()}.tmp"
+            try:
+                with open(sciezka_tmp, "w", encoding="utf-8") as f:
+                    json.dump(historia, f)
+                os.replace(sciezka_tmp, self.plik_historii)
+            except OSError:
+                # Nie udało się zapisać - spróbujemy przy kolejnym zadaniu
+                with self._lock:
+                    self._niezapisane = nowe + self._niezapisane
+            finally:
+                if os.path.exists(sciezka_tmp):
+                    os.remove(sciezka_tmp)
+
+    def szacuj(self, zadanie: dict) -> float:
+        """Szacowany czas wykonania zadania w sekundach."""
+        a, b = self._model
+        return a + b * self.cecha_zadania(zadanie)
+
+    def uporzadkuj(self, zadania: list[dict]) -> list[dict]:
+        """Zwraca zadania posortowane od najdłuższego (LPT) i zapamiętuje je."""
+        for z in zadania:
+            z["_koszt"] = self.szacuj(z)
+        kolejka = sorted(zadania, key=lambda z: z["_koszt"], reverse=True)
+        with self._lock:
+            self._oczekujace = {id(z): z for z in kolejka}
+        return kolejka
+
+    def uruchom(self, funkcja: Callable[[dict], dict], zadanie: dict) -> dict:
+        """Wykonuje zadanie mierząc jego czas - funkcja dla wątku."""
+        start = time.monotonic()
+        with self._lock:
+            self._oczekujace.pop(id(zadanie), None)
+            self._w_toku[id(zadanie)] = {"zadanie": zadanie, "start": start}
+        try:
+            return funkcja(zadanie)
+        finally:
+            zadanie["_czas"] = time.monotonic() - start
+
+    def zakonczono(self, zadanie: dict, sukces: bool = True):
+        """
+        Oznacza zadanie jako zakończone. Czas udanych zadań trafia do historii
+        (od razu zapisywanej na dysk) i model kosztu jest dopasowywany na nowo.
+        """
+        with self._lock:
+            self._w_toku.pop(id(zadanie), None)
+            self._oczekujace.pop(id(zadanie), None)
+            if not sukces or "_czas" not in zadanie:
+                return
+
+            probka = [self.cecha_zadania(zadanie), round(zadanie["_czas"], 3)]
+            probki = self._historia.setdefault(self.cecha, [])
+            probki.append(probka)
+            del probki[:-MAX_PROBEK]
+            self._model = dopasuj_model(probki, self.domyslny)
+            self._niezapisane.append(probka)
+
+        self.zapisz_historie()
+
+    def eta(self) -> float:
+        """
+        Szacowany czas do końca partii: symulacja przydziału LPT pozostałych
+        zadań do workerów, z uwzględnieniem zadań już trwających.
+        """
+        teraz = time.monotonic()
+        with self._lock:
+            obciazenia = [
+                max(0.0, self.szacuj(w["zadanie"]) - (teraz - w["start"]))
+                for w in self._w_toku.values()
+            ]
+            obciazenia += [0.0] * max(0, self.liczba_workerow - len(obciazenia))
+            heapq.heapify(obciazenia)
+
+            for z in self._oczekujace.values():
+                heapq.heappush(obciazenia, heapq.heappop(obciazenia) + self.szacuj(z))
+
+        return max(obciazenia, default=0.0)
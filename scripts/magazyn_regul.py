@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Magazyn reguł w formacie NDJSON z binarnym indeksem przesunięć.
+Pozwala odczytać pojedynczą regułę (lub przefiltrować bazę po statusie
+i kategorii) bez wczytywania całej bazy do pamięci.
+
+Format:
+- rules_database.ndjson - jedna reguła (JSON) na linię,
+- rules_database.idx    - nagłówek (z rozmiarem pliku NDJSON) + posortowane
+  po _id_wypadku wpisy (id, przesunięcie, długość, kod statusu, kod kategorii).
+
+Oba pliki zapisywane są przez pliki tymczasowe i os.replace (indeks na końcu),
+więc czytelnik nigdy nie widzi obciętego pliku, a niespójna para plików
+jest wykrywana po rozmiarze zapisanym w nagłówku.
+"""
+
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterator, Optional
+
+# =============================================================================
+# FORMAT PLIKÓW
+# =============================================================================
+
+PLIK_NDJSON = Path("./rules_database.ndjson")
+PLIK_INDEKS = Path("./rules_database.idx")
+
+NAGLOWEK = struct.Struct("<4sIQ")  # magic, liczba wpisów, rozmiar NDJSON
+WPIS = struct.Struct("<IQIBB")  # id, przesunięcie, długość, status, kategoria
+MAGIC = b"RIX2"
+
+# Kod 0 oznacza wartość nieznaną / spoza listy
+STATUSY = ("", "UZNANY", "NIEUZNANY")
+KATEGORIE = (
+    "NIEZNANA",
+    "PRZYCZYNA_ZEWNETRZNA",
+    "NAGLOSC",
+    "ZWIAZEK_Z_PRACA",
+    "STAN_NIETRZEZWOSCI",
+    "INNE",
+)
+
+
+def _kod(wartosc: str, slownik: tuple) -> int:
+    return slownik.index(wartosc) if wartosc in slownik else 0
+
+
+def _kod_filtra(wartosc: str, slownik: tuple) -> int:
+    """Kod wartości filtra; wartość spoza słownika to błąd, a nie "nieznana"."""
+    if wartosc not in slownik:
+        raise ValueError(f"Nieznana wartość filtra: {wartosc!r} (dozwolone: {slownik})")
+    return slownik.index(wartosc)
+
+
+# =============================================================================
+# ZAPIS
+# =============================================================================
+
+
+def zapisz_ndjson(reguly: list[dict], plik_ndjson: Path, plik_indeks: Path):
+    """
+    Zapisuje reguły jako NDJSON oraz indeks przesunięć kluczowany _id_wypadku.
+    Istniejące pliki są podmieniane atomowo, więc otwarty RulesStore
+    (mmap starych plików) pozostaje poprawny.
+    """
+    tmp_ndjson = Path(f"{plik_ndjson}.{os.getpid()}.tmp")
+    tmp_indeks = Path(f"{plik_indeks}.{os.getpid()}.tmp")
+    try:
+        _zapisz_pliki(reguly, tmp_ndjson, tmp_indeks)
+        # Najpierw dane, indeks na końcu - stary indeks nie pasuje rozmiarem
+        # do nowych danych, więc czytelnik otwierający pliki pomiędzy
+        # podmianami dostanie błąd zamiast złej reguły
+        os.replace(tmp_ndjson, plik_ndjson)
+        os.replace(tmp_indeks, plik_indeks)
+    finally:
+        for tmp in (tmp_ndjson, tmp_indeks):
+            if tmp.exists():
+                tmp.unlink()
+
+
+def _zapisz_pliki(reguly: list[dict], plik_ndjson: Path, plik_indeks: Path):
+    wpisy = []
+    przesuniecie = 0
+
+    with open(plik_ndjson, "wb") as f:
+        for r in reguly:
+            linia = json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n"
+            f.write(linia)
+
+            status = r.get("analiza_decyzji", {}).get("status", "")
+            kategoria = r.get("regula_ekspercka", {}).get("kategoria_problemu", "")
+            wpisy.append(
+                (
+                    r["_id_wypadku"],
+                    przesuniecie,
+                    len(linia) - 1,
+                    _kod(status, STATUSY),
+                    _kod(kategoria, KATEGORIE),
+                )
+            )
+            przesuniecie += len(linia)
+
+    wpisy.sort(key=lambda w: w[0])
+    with open(plik_indeks, "wb") as f:
+        f.write(NAGLOWEK.pack(MAGIC, len(wpisy), przesuniecie))
+        for w in wpisy:
+            f.write(WPIS.pack(*w))
+
+
+# =============================================================================
+# ODCZYT
+# =============================================================================
+
+
+class Regula:
+    """Pojedyncza reguła odczytana z magazynu."""
+
+    __slots__ = (
+        "id_wypadku",
+        "plik_zrodlowy",
+        "meta_data",
+        "analiza_decyzji",
+        "fakty_kluczowe",
+        "regula_ekspercka",
+        "wnioski_dla_bota",
+        "brakujace_dokumenty",
+    )
+
+    def __init__(self, data: dict):
+        self.id_wypadku = data.get("_id_wypadku")
+        self.plik_zrodlowy = data.get("_plik_zrodlowy")
+        self.meta_data = data.get("meta_data", {})
+        self.analiza_decyzji = data.get("analiza_decyzji", {})
+        self.fakty_kluczowe = data.get("fakty_kluczowe", [])
+        self.regula_ekspercka = data.get("regula_ekspercka", {})
+        self.wnioski_dla_bota = data.get("wnioski_dla_bota", {})
+        self.brakujace_dokumenty = data.get("brakujace_dokumenty", [])
+
+    def __repr__(self) -> str:
+        return f"Regula(id_wypadku={self.id_wypadku})"
+
+
+class RulesStore:
+    """
+    Magazyn reguł tylko do odczytu, oparty o mmap plików NDJSON i indeksu.
+    Reguły dekodowane są dopiero przy dostępie.
+    """
+
+    def __init__(
+        self, plik_ndjson: Path = PLIK_NDJSON, plik_indeks: Path = PLIK_INDEKS
+    ):
+        self._f_dane = self._f_indeks = None
+        self._dane = self._indeks = None
+        self._liczba = 0
+
+        try:
+            self._f_dane = open(plik_ndjson, "rb")
+            self._f_indeks = open(plik_indeks, "rb")
+            self._indeks = self._mapuj(self._f_indeks)
+
+            if len(self._indeks) < NAGLOWEK.size:
+                raise ValueError(f"Niepoprawny plik indeksu: {plik_indeks}")
+            magic, liczba, rozmiar = NAGLOWEK.unpack_from(self._indeks, 0)
+            if magic != MAGIC:
+                raise ValueError(f"Niepoprawny plik indeksu: {plik_indeks}")
+            if len(self._indeks) != NAGLOWEK.size + liczba * WPIS.size:
+                raise ValueError(f"Uszkodzony plik indeksu: {plik_indeks}")
+            if os.fstat(self._f_dane.fileno()).st_size != rozmiar:
+                raise ValueError(
+                    f"Indeks {plik_indeks} nie pasuje do danych {plik_ndjson} "
+                    "(pliki z różnych zapisów)"
+                )
+
+            self._dane = self._mapuj(self._f_dane)
+            self._liczba = liczba
+        except Exception:
+            self.close()
+            raise
+
+    @staticmethod
+    def _mapuj(f):
+        """Mapuje plik do pamięci; pusty plik (pusty magazyn) daje puste bajty."""
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for zasob in (self._dane, self._indeks, self._f_dane, self._f_indeks):
+            if zasob is not None and hasattr(zasob, "close"):
+                zasob.close()
+        self._dane = self._indeks = self._f_dane = self._f_indeks = None
+
+    def __enter__(self) -> "RulesStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._liczba
+
+    def _wpis(self, i: int) -> tuple:
+        return WPIS.unpack_from(self._indeks, NAGLOWEK.size + i * WPIS.size)
+
+    def _dekoduj(self, przesuniecie: int, dlugosc: int) -> Regula:
+        return Regula(json.loads(self._dane[przesuniecie : przesuniecie + dlugosc]))
+
+    def get(self, id_wypadku: int) -> Optional[Regula]:
+        """Zwraca regułę wypadku (wyszukiwanie binarne w indeksie) lub None."""
+        lo, hi = 0, self._liczba
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._wpis(mid)[0] < id_wypadku:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._liczba:
+            id_, przesuniecie, dlugosc, _, _ = self._wpis(lo)
+            if id_ == id_wypadku:
+                return self._dekoduj(przesuniecie, dlugosc)
+        return None
+
+    def __contains__(self, id_wypadku: int) -> bool:
+        return self.get(id_wypadku) is not None
+
+    def ids(self) -> Iterator[int]:
+        """Iteruje po numerach wypadków bez dekodowania reguł."""
+        for i in range(self._liczba):
+            yield self._wpis(i)[0]
+
+    def filtruj(
+        self, status: Optional[str] = None, kategoria: Optional[str] = None
+    ) -> Iterator[Regula]:
+        """
+        Iteruje po regułach pasujących do statusu i/lub kategorii.
+        Filtrowanie odbywa się na indeksie - dekodowane są tylko trafienia.
+        Wartość spoza STATUSY / KATEGORIE zgłasza ValueError.
+        """
+        kod_statusu = None if status is None else _kod_filtra(status, STATUSY)
+        kod_kategorii = None if kategoria is None else _kod_filtra(kategoria, KATEGORIE)
+        return self._filtruj_kody(kod_statusu, kod_kategorii)
+
+    def _filtruj_kody(
+        self, kod_statusu: Optional[int], kod_kategorii: Optional[int]
+    ) -> Iterator[Regula]:
+        for i in range(self._liczba):
+            _, przesuniecie, dlugosc, s, k = self._wpis(i)
+            if kod_statusu is not None and s != kod_statusu:
+                continue
+            if kod_kategorii is not None and k != kod_kategorii:
+                continue
+            yield self._dekoduj(przesuniecie, dlugosc)
+
+    def __iter__(self) -> Iterator[Regula]:
+        return self.filtruj()
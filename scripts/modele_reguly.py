@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Modele Pydantic opisujące schemat reguły wypadku.
+Współdzielone przez skrypt-reguly.py (generowanie) i
+skrypt-polacz-reguly.py (walidacja przy łączeniu bazy).
+"""
+
+from typing import Literal
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class MetaData(BaseModel):
+    """Metadane zdarzenia wypadkowego."""
+
+    data_zdarzenia: str = Field(..., description="Data w formacie YYYY-MM-DD")
+    godzina_zdarzenia: str = Field(..., description="Godzina w formacie HH:MM")
+    miejsce_zdarzenia: str = Field(
+        ..., description="Miejsce zdarzenia np. warsztat, biuro, droga do pracy"
+    )
+    rodzaj_urazu: str = Field(..., description="Rodzaj urazu z dokumentacji medycznej")
+
+    @field_validator("data_zdarzenia")
+    @classmethod
+    def validate_data(cls, v: str) -> str:
+        # Akceptuj różne formaty, ale preferuj YYYY-MM-DD
+        if v and v not in ["BRAK", "NIEZNANA", "brak", "nieznana"]:
+            # Próba normalizacji formatu
+            v = v.strip()
+        return v
+
+    @field_validator("godzina_zdarzenia")
+    @classmethod
+    def validate_godzina(cls, v: str) -> str:
+        if v and v not in ["BRAK", "NIEZNANA", "brak", "nieznana"]:
+            v = v.strip()
+        return v
+
+
+class AnalizaDecyzji(BaseModel):
+    """Analiza decyzji w sprawie wypadku."""
+
+    status: Literal["UZNANY", "NIEUZNANY"] = Field(
+        ..., description="Status decyzji: UZNANY lub NIEUZNANY"
+    )
+    powod_odrzucenia: str = Field(
+        ..., description="Powód odrzucenia (BRAK jeśli uznany)"
+    )
+    podstawa_prawna_cytat: str = Field(
+        ..., description="Dosłowny cytat z Opinii Prawnej uzasadniający decyzję"
+    )
+
+
+class RegulaEkspercka(BaseModel):
+    """Reguła ekspercka wyciągnięta z przypadku."""
+
+    warunek: str = Field(
+        ...,
+        description="Zwięzły opis okoliczności np. 'Upadek na śliskiej nawierzchni w miejscu pracy'",
+    )
+    logika: str = Field(
+        ...,
+        description="Logika w formacie: JEŚLI [okoliczności] ORAZ [warunek] TO [decyzja] PONIEWAŻ [uzasadnienie]",
+    )
+    kategoria_problemu: Literal[
+        "PRZYCZYNA_ZEWNETRZNA",
+        "NAGLOSC",
+        "ZWIAZEK_Z_PRACA",
+        "STAN_NIETRZEZWOSCI",
+        "INNE",
+    ] = Field(..., description="Kategoria problemu prawnego")
+
+
+class WnioskiDlaBota(BaseModel):
+    """Wnioski dla chatbota decyzyjnego."""
+
+    czego_szukac_w_przyszlosci: str = Field(
+        ...,
+        description="Wskazówka o co pytać w podobnych sprawach",
+    )
+    ryzyko_odrzucenia: Literal["NISKIE", "SREDNIE", "WYSOKIE"] = Field(
+        ..., description="Ocena ryzyka dla podobnych spraw"
+    )
+
+
+class RegulaWypadku(BaseModel):
+    """Kompletna reguła wypadku - główny model."""
+
+    meta_data: MetaData
+    analiza_decyzji: AnalizaDecyzji
+    fakty_kluczowe: list[str] = Field(
+        ..., min_length=1, description="Lista kluczowych faktów"
+    )
+    regula_ekspercka: RegulaEkspercka
+    wnioski_dla_bota: WnioskiDlaBota
+    brakujace_dokumenty: list[str] = Field(
+        default_factory=list, description="Lista brakujących dokumentów"
+    )
@@ -1,8 +1,27 @@
 import google.generativeai as genai
 import os
+import queue
+import shutil
+import tempfile
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from threading import Event, Lock, Thread
+from typing import Optional
+
+from harmonogram import Harmonogram, formatuj_czas
+
+try:
+    import fitz  # PyMuPDF - opcjonalnie, do kompresji i rasteryzacji PDF
+except ImportError:
+    fitz = None
+
+try:
+    import pytesseract  # Opcjonalnie, lokalny silnik OCR (Tesseract + dane "pol")
+    from PIL import Image
+except ImportError:
+    pytesseract = None
 
 # Konfiguracja
 genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
@@ -17,6 +36,29 @@ os.makedirs(folder_wyniki, exist_ok=True)
 LIMIT_PDF = 200
 # Liczba równoległych wątków
 MAX_WORKERS = 3
+# Maksymalny czas oczekiwania (w sekundach) na kolejny fragment strumienia
+STREAM_CHUNK_TIMEOUT = 60
+# Maksymalny czas oczekiwania na pierwszy fragment (obejmuje fazę "myślenia" modelu)
+STREAM_FIRST_CHUNK_TIMEOUT = 300
+
+# Silnik OCR:
+# - "zdalny"     - cały PDF przez Gemini,
+# - "lokalny"    - Tesseract, bez dostępu do API,
+# - "hybrydowy"  - Tesseract, a strony o niskiej pewności przez Gemini.
+SILNIK_OCR = "zdalny"
+LOKALNY_JEZYK = "pol"
+LOKALNY_DPI = 300
+LOKALNY_PROCESY = os.cpu_count() or 1
+# Średnia pewność Tesseracta (0-100), poniżej której strona idzie do Gemini
+PROG_PEWNOSCI = 70
+DELAY_BETWEEN_REQUESTS = 2  # Sekundy przed każdym zapytaniem o stronę (rate limiting)
+MAX_RETRIES = 3  # Maksymalna liczba prób przepisania strony przez Gemini
+
+# Kompresja wstępna skanów przed uploadem (wymaga PyMuPDF)
+KOMPRESJA_PDF = True
+KOMPRESJA_DPI = 200  # Docelowa rozdzielczość stron (wystarczająca do OCR)
+KOMPRESJA_JAKOSC_JPEG = 75
+KOMPRESJA_PROCESY = os.cpu_count() or 1
 
 # Thread-safe liczniki
 lock = Lock()
@@ -24,34 +66,438 @@ licznik_przetworzonych = 0
 licznik_pomietych = 0
 licznik_bledow = 0
 
+# Znacznik końca strumienia w kolejce fragmentów
+_KONIEC_STRUMIENIA = object()
+# Powody zakończenia oznaczające kompletną odpowiedź
+_POPRAWNE_ZAKONCZENIA = ("STOP", "FINISH_REASON_UNSPECIFIED")
 
-def przetworz_pdf(zadanie: dict) -> dict:
-    """Przetwarza pojedynczy plik PDF - funkcja dla wątku."""
+
+def sprawdz_fragment(chunk):
+    """
+    Zgłasza wyjątek, gdy fragment kończy odpowiedź z innego powodu niż STOP
+    (np. SAFETY, RECITATION, MAX_TOKENS) albo prompt został zablokowany.
+    Obcięta lub zablokowana transkrypcja nie może trafić do wyników.
+    """
+    if not chunk.candidates:
+        blokada = getattr(chunk.prompt_feedback, "block_reason", None)
+        if blokada:
+            raise ValueError(f"Prompt zablokowany: {getattr(blokada, 'name', blokada)}")
+        return
+
+    powod = chunk.candidates[0].finish_reason
+    nazwa = getattr(powod, "name", None) or str(powod or "FINISH_REASON_UNSPECIFIED")
+    if nazwa not in _POPRAWNE_ZAKONCZENIA:
+        raise ValueError(f"Odpowiedź przerwana przez model: {nazwa}")
+
+
+def zamknij_strumien(odpowiedz):
+    """
+    Próbuje zamknąć połączenie strumienia (anulowanie strumienia gRPC lub
+    zamknięcie iteratora REST). Biblioteka nie udostępnia publicznego API
+    do tego, więc jest to próba "best effort".
+    """
+    iterator = getattr(odpowiedz, "_iterator", None)
+    for metoda in ("cancel", "close"):
+        zamknij = getattr(iterator, metoda, None)
+        if callable(zamknij):
+            try:
+                zamknij()
+            except Exception:
+                pass
+            return
+
+
+def odbieraj_strumien(generuj, kolejka: queue.Queue, przerwij: Event, uchwyt: dict):
+    """
+    Wywołuje model i przekazuje fragmenty strumienia do kolejki - funkcja dla
+    wątku pomocniczego. Samo wywołanie blokuje do pierwszego fragmentu, więc
+    również ono odbywa się tutaj, pod kontrolą limitu czasu.
+    Odpowiedź trafia do `uchwyt["odpowiedz"]`, by można ją było zamknąć;
+    po ustawieniu `przerwij` wątek kończy się przy najbliższym fragmencie.
+    """
+    try:
+        odpowiedz = generuj()
+        uchwyt["odpowiedz"] = odpowiedz
+        if przerwij.is_set():
+            zamknij_strumien(odpowiedz)
+            return
+
+        for chunk in odpowiedz:
+            if przerwij.is_set():
+                zamknij_strumien(odpowiedz)
+                return
+            sprawdz_fragment(chunk)
+            # Fragment bez treści, zakończony poprawnie (np. same statystyki)
+            if chunk.parts:
+                kolejka.put(chunk.text)
+        kolejka.put(_KONIEC_STRUMIENIA)
+    except Exception as e:
+        kolejka.put(e)
+
+
+@contextmanager
+def plik_atomowy(sciezka_txt: str):
+    """
+    Udostępnia plik tymczasowy do zapisu; po udanym zapisie atomowo podmienia
+    nim plik docelowy, a przy błędzie usuwa go.
+    """
+    sciezka_tmp = sciezka_txt + ".tmp"
+    try:
+        with open(sciezka_tmp, "w", encoding="utf-8") as f:
+            yield f
+        os.replace(sciezka_tmp, sciezka_txt)
+    finally:
+        if os.path.exists(sciezka_tmp):
+            os.remove(sciezka_tmp)
+
+
+def zapisz_strumien(generuj, sciezka_txt: str):
+    """
+    Dopisuje kolejne fragmenty odpowiedzi (strumień zwracany przez `generuj`)
+    do pliku tymczasowego i po zakończeniu atomowo podmienia go na plik
+    docelowy. Przerywa, gdy strumień utknie - także przed pierwszym fragmentem.
+
+    Po przekroczeniu limitu połączenie jest zamykane, a wątek pomocniczy
+    kończy się. Jeśli model nie zwrócił jeszcze nawet obiektu odpowiedzi,
+    wątek jest porzucany i kończy się zaraz po powrocie wywołania.
+    """
+    kolejka = queue.Queue()
+    przerwij = Event()
+    uchwyt = {}
+    Thread(
+        target=odbieraj_strumien,
+        args=(generuj, kolejka, przerwij, uchwyt),
+        daemon=True,
+    ).start()
+
+    with plik_atomowy(sciezka_txt) as f:
+        limit = STREAM_FIRST_CHUNK_TIMEOUT
+        while True:
+            try:
+                fragment = kolejka.get(timeout=limit)
+            except queue.Empty:
+                przerwij.set()
+                if "odpowiedz" in uchwyt:
+                    zamknij_strumien(uchwyt["odpowiedz"])
+                raise TimeoutError(f"Brak kolejnego fragmentu od {limit}s")
+            limit = STREAM_CHUNK_TIMEOUT
+            if fragment is _KONIEC_STRUMIENIA:
+                break
+            if isinstance(fragment, Exception):
+                raise fragment
+            f.write(fragment)
+            f.flush()
+
+
+def kompresuj_obraz(dokument, strona, xref: int) -> Optional[bytes]:
+    """
+    Zwraca obraz `xref` przekodowany do JPEG w skali szarości i zmniejszony
+    do KOMPRESJA_DPI (względem rozmiaru na stronie) albo None, gdy nie warto.
+    """
+    prostokaty = strona.get_image_rects(xref)
+    if not prostokaty:
+        return None
+
+    pix = fitz.Pixmap(dokument, xref)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.colorspace is None or pix.colorspace.n != 1:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+
+    # Największy prostokąt wyznacza potrzebną rozdzielczość
+    szerokosc_cali = max(r.width for r in prostokaty) / 72
+    if szerokosc_cali > 0:
+        dpi = pix.width / szerokosc_cali
+        if dpi > KOMPRESJA_DPI:
+            skala = KOMPRESJA_DPI / dpi
+            pix = fitz.Pixmap(
+                pix, max(1, int(pix.width * skala)), max(1, int(pix.height * skala))
+            )
+
+    dane = pix.tobytes("jpeg", jpg_quality=KOMPRESJA_JAKOSC_JPEG)
+    if len(dane) >= len(dokument.xref_stream_raw(xref) or b""):
+        return None
+    return dane
+
+
+def kompresuj_pdf(zadanie: dict) -> dict:
+    """
+    Przekodowuje osadzone obrazy (skany) do JPEG w skali szarości
+    w KOMPRESJA_DPI i usuwa nieużywane obiekty - funkcja dla procesu.
+    Tekst i grafika wektorowa (np. pieczątki, nakładki anonimizacji)
+    pozostają bez zmian. Obrazy z maskami przezroczystości są pomijane.
+    """
     sciezka_pdf = zadanie["sciezka_pdf"]
+    sciezka_wyjscia = zadanie["sciezka_kompresji"]
+
+    result = {
+        "plik": zadanie["plik"],
+        "rozmiar_przed": None,
+        "rozmiar_po": None,
+        "error": None,
+    }
+
+    try:
+        result["rozmiar_przed"] = os.path.getsize(sciezka_pdf)
+
+        with fitz.open(sciezka_pdf) as dokument:
+            przetworzone = set()
+            for strona in dokument:
+                for obraz in strona.get_images(full=True):
+                    xref, smask = obraz[0], obraz[1]
+                    if xref in przetworzone or smask:
+                        continue
+                    przetworzone.add(xref)
+
+                    dane = kompresuj_obraz(dokument, strona, xref)
+                    if dane is not None:
+                        strona.replace_image(xref, stream=dane)
+
+            dokument.save(sciezka_wyjscia, garbage=4, deflate=True)
+
+        result["rozmiar_po"] = os.path.getsize(sciezka_wyjscia)
+    except Exception as e:
+        result["error"] = str(e)
+
+    return result
+
+
+def kompresuj_zadania(zadania: list, folder_tmp: str) -> int:
+    """
+    Kompresuje pliki PDF w puli procesów. Zadanie dostaje "sciezka_upload"
+    tylko wtedy, gdy skompresowany plik jest mniejszy od oryginału.
+    Błąd kompresji dotyczy tylko danego pliku - wysyłany jest oryginał.
+    Awaria procesu psuje całą pulę (BrokenProcessPool we wszystkich
+    niedokończonych zadaniach), więc niedokończone pliki są kompresowane
+    ponownie, każdy w osobnej jednoprocesowej puli.
+    Zwraca łączną liczbę zaoszczędzonych bajtów.
+    """
+    for i, z in enumerate(zadania):
+        z["sciezka_kompresji"] = os.path.join(folder_tmp, f"{i}.pdf")
+
+    zaoszczedzone = 0
+    niedokonczone = []
+
+    def obsluz_wynik(z: dict, wynik: dict):
+        nonlocal zaoszczedzone
+        if wynik["error"] is not None:
+            print(
+                f"  ⚠ Kompresja nieudana, wysyłam oryginał: {z['plik']}: {wynik['error']}"
+            )
+        elif wynik["rozmiar_po"] < wynik["rozmiar_przed"]:
+            z["sciezka_upload"] = z["sciezka_kompresji"]
+            zaoszczedzone += wynik["rozmiar_przed"] - wynik["rozmiar_po"]
+
+    with ProcessPoolExecutor(max_workers=KOMPRESJA_PROCESY) as executor:
+        future_to_zadanie = {executor.submit(kompresuj_pdf, z): z for z in zadania}
+
+        for future in as_completed(future_to_zadanie):
+            z = future_to_zadanie[future]
+            try:
+                wynik = future.result()
+            except BrokenProcessPool:
+                niedokonczone.append(z)
+                continue
+            except Exception as e:
+                wynik = {"error": str(e) or type(e).__name__}
+            obsluz_wynik(z, wynik)
+
+    if niedokonczone:
+        print(
+            f"  ⚠ Awaria procesu kompresji - ponawiam {len(niedokonczone)} plików osobno"
+        )
+    for z in niedokonczone:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            try:
+                wynik = executor.submit(kompresuj_pdf, z).result()
+            except Exception as e:
+                wynik = {"error": str(e) or type(e).__name__}
+        obsluz_wynik(z, wynik)
+
+    return zaoszczedzone
+
+
+def przepisz_strone_zdalnie(obraz: bytes) -> str:
+    """
+    Przepisuje obraz strony przez Gemini z ponawianiem (dłuższe czekanie
+    przy limicie zapytań). Zgłasza wyjątek, gdy wszystkie próby zawiodą.
+    """
+    last_error = None
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            # Rate limiting
+            time.sleep(DELAY_BETWEEN_REQUESTS)
+
+            response = model.generate_content(
+                [
+                    "Przepisz dokładnie treść tej strony dokumentu.",
+                    {"mime_type": "image/png", "data": obraz},
+                ]
+            )
+            return response.text
+
+        except Exception as e:
+            last_error = e
+            if "429" in str(e) or "quota" in str(e).lower():
+                # Rate limit - czekaj dłużej
+                time.sleep((attempt + 1) * 30)
+            else:
+                time.sleep(5)
+
+    raise Exception(
+        f"Nie udało się przepisać strony po {MAX_RETRIES} próbach: {last_error}"
+    )
+
+
+def tesseract_dostepny() -> bool:
+    """Czy lokalny OCR może działać: biblioteki, program tesseract i dane języka."""
+    if fitz is None or pytesseract is None:
+        return False
+    try:
+        return LOKALNY_JEZYK in pytesseract.get_languages()
+    except Exception:
+        # Np. TesseractNotFoundError - brak programu tesseract w PATH
+        return False
+
+
+def ocr_strony_lokalnie(sciezka_pdf: str, nr_strony: int) -> dict:
+    """
+    Rasteryzuje stronę PDF i rozpoznaje ją Tesseractem - funkcja dla procesu.
+    Obraz strony zwracany jest tylko w trybie hybrydowym przy niskiej pewności
+    (do ponowienia zdalnie).
+    """
+    with fitz.open(sciezka_pdf) as dokument:
+        pix = dokument[nr_strony].get_pixmap(dpi=LOKALNY_DPI, colorspace=fitz.csGRAY)
+
+    obraz = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+    dane = pytesseract.image_to_data(
+        obraz, lang=LOKALNY_JEZYK, output_type=pytesseract.Output.DICT
+    )
+
+    # Składamy tekst z rozpoznanych słów, zachowując podział na linie
+    linie = {}
+    pewnosci = []
+    for i, slowo in enumerate(dane["text"]):
+        pewnosc = float(dane["conf"][i])
+        if pewnosc < 0 or not slowo.strip():
+            continue
+        klucz = (dane["block_num"][i], dane["par_num"][i], dane["line_num"][i])
+        linie.setdefault(klucz, []).append(slowo)
+        pewnosci.append(pewnosc)
+
+    pewnosc = sum(pewnosci) / len(pewnosci) if pewnosci else 0.0
+    return {
+        "tekst": "\n".join(" ".join(slowa) for slowa in linie.values()),
+        "pewnosc": pewnosc,
+        "obraz": (
+            pix.tobytes("png")
+            if SILNIK_OCR == "hybrydowy" and pewnosc < PROG_PEWNOSCI
+            else None
+        ),
+    }
+
+
+def ocr_lokalny(zadanie: dict) -> dict:
+    """
+    Przetwarza PDF lokalnie (strony równolegle w puli procesów) - funkcja dla wątku.
+    W trybie hybrydowym strony o niskiej pewności są przepisywane przez Gemini.
+    """
+    sciezka_pdf = zadanie["sciezka_pdf"]
+
+    result = {
+        "plik": zadanie["plik"],
+        "status": "ok",
+        "error": None,
+        "bajty_upload": 0,
+        "czas_upload": 0.0,
+        "strony_zdalne": 0,
+        "strony_zdalne_bledy": 0,
+    }
+
+    try:
+        with fitz.open(sciezka_pdf) as dokument:
+            liczba_stron = dokument.page_count
+
+        futures = [
+            pula_ocr.submit(ocr_strony_lokalnie, sciezka_pdf, nr)
+            for nr in range(liczba_stron)
+        ]
+
+        strony = []
+        for nr, future in enumerate(futures):
+            try:
+                strona = future.result()
+            except Exception:
+                # Dokument i tak jest nieudany - nie zajmujemy puli resztą stron
+                for f in futures[nr + 1 :]:
+                    f.cancel()
+                raise
+            tekst = strona["tekst"]
+
+            if SILNIK_OCR == "hybrydowy" and strona["obraz"] is not None:
+                try:
+                    tekst = przepisz_strone_zdalnie(strona["obraz"])
+                    result["strony_zdalne"] += 1
+                except Exception as e:
+                    # Zostajemy przy wyniku lokalnym, ale błąd jest raportowany
+                    result["strony_zdalne_bledy"] += 1
+                    print(
+                        f"  ⚠ {zadanie['plik']}, strona {nr + 1}: wynik lokalny ({e})"
+                    )
+
+            strony.append(tekst)
+
+        with plik_atomowy(zadanie["sciezka_txt"]) as f:
+            f.write("\n\n".join(strony))
+
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+
+    return result
+
+
+def ocr_zdalny(zadanie: dict) -> dict:
+    """Przetwarza pojedynczy plik PDF przez Gemini - funkcja dla wątku."""
+    sciezka_pdf = zadanie["sciezka_pdf"]
+    sciezka_upload = zadanie.get("sciezka_upload", sciezka_pdf)
     sciezka_txt = zadanie["sciezka_txt"]
     plik = zadanie["plik"]
 
-    result = {"plik": plik, "status": "ok", "error": None}
+    result = {
+        "plik": plik,
+        "status": "ok",
+        "error": None,
+        "bajty_upload": 0,
+        "czas_upload": 0.0,
+        "strony_zdalne": 0,
+        "strony_zdalne_bledy": 0,
+    }
 
     uploaded_file = None
     try:
-        # 1. Upload pliku
-        uploaded_file = genai.upload_file(sciezka_pdf)
+        # 1. Upload pliku (skompresowanego, jeśli jest mniejszy)
+        start = time.perf_counter()
+        uploaded_file = genai.upload_file(sciezka_upload, mime_type="application/pdf")
+        result["czas_upload"] = time.perf_counter() - start
+        result["bajty_upload"] = os.path.getsize(sciezka_upload)
 
         # 2. Czekanie na przetworzenie
         while uploaded_file.state.name == "PROCESSING":
             time.sleep(2)
             uploaded_file = genai.get_file(uploaded_file.name)
 
-        # 3. OCR
-        response = model.generate_content(
-            ["Przepisz dokładnie treść tego dokumentu.", uploaded_file]
+        # 3-4. OCR (strumieniowo) i zapis wyniku w miarę napływania fragmentów
+        # (thread-safe dzięki osobnym plikom)
+        zapisz_strumien(
+            lambda: model.generate_content(
+                ["Przepisz dokładnie treść tego dokumentu.", uploaded_file],
+                stream=True,
+            ),
+            sciezka_txt,
         )
 
-        # 4. Zapis wyniku (thread-safe dzięki osobnym plikom)
-        with open(sciezka_txt, "w", encoding="utf-8") as f:
-            f.write(response.text)
-
         result["status"] = "ok"
 
     except Exception as e:
@@ -68,6 +514,50 @@ def przetworz_pdf(zadanie: dict) -> dict:
     return result
 
 
+# Dostępne silniki OCR - każdy przyjmuje zadanie i zwraca słownik wyniku
+SILNIKI_OCR = {
+    "zdalny": ocr_zdalny,
+    "lokalny": ocr_lokalny,
+    "hybrydowy": ocr_lokalny,
+}
+
+# Pula procesów dla silnika lokalnego (tworzona w głównej logice)
+pula_ocr = None
+
+
+def przetworz_pdf(zadanie: dict) -> dict:
+    """Przetwarza pojedynczy plik PDF wybranym silnikiem - funkcja dla wątku."""
+    return SILNIKI_OCR[SILNIK_OCR](zadanie)
+
+
+def policz_strony(sciezka_pdf: str) -> int:
+    """Zwraca liczbę stron PDF (1 jeśli nie da się jej ustalić)."""
+    if fitz is None:
+        return 1
+    try:
+        with fitz.open(sciezka_pdf) as dokument:
+            return max(1, dokument.page_count)
+    except Exception:
+        return 1
+
+
+def utworz_harmonogram() -> Harmonogram:
+    """
+    Tworzy harmonogram LPT. Koszt OCR szacowany jest z liczby stron
+    (z PyMuPDF) lub z rozmiaru pliku w MB.
+    """
+    if fitz is not None:
+        return Harmonogram(
+            f"ocr_{SILNIK_OCR}_strony", lambda z: z["strony"], (5.0, 8.0), MAX_WORKERS
+        )
+    return Harmonogram(
+        f"ocr_{SILNIK_OCR}_mb",
+        lambda z: z["rozmiar"] / 1024 / 1024,
+        (5.0, 4.0),
+        MAX_WORKERS,
+    )
+
+
 def zbierz_zadania() -> list:
     """Zbiera wszystkie pliki PDF do przetworzenia."""
     global licznik_pomietych
@@ -105,6 +595,8 @@ def zbierz_zadania() -> list:
                     "sciezka_txt": sciezka_txt,
                     "plik": plik,
                     "folder": folder_wypadku,
+                    "rozmiar": os.path.getsize(sciezka_pdf),
+                    "strony": policz_strony(sciezka_pdf),
                 }
             )
 
@@ -116,42 +608,113 @@ def zbierz_zadania() -> list:
     return zadania
 
 
-# Główna logika
-print("=== Zbieranie plików do przetworzenia ===")
-zadania = zbierz_zadania()
+# =============================================================================
+# GŁÓWNA LOGIKA
+# =============================================================================
 
-if not zadania:
-    print("\n=== Brak nowych plików do przetworzenia ===")
-else:
-    print(
-        f"\n=== Rozpoczynam przetwarzanie {len(zadania)} plików ({MAX_WORKERS} równolegle) ==="
-    )
+if __name__ == "__main__":
+    if SILNIK_OCR not in SILNIKI_OCR:
+        print(f"✗ Nieznany silnik OCR: {SILNIK_OCR}")
+        exit(1)
+    if SILNIK_OCR != "zdalny" and not tesseract_dostepny():
+        print(
+            f"✗ Silnik '{SILNIK_OCR}' wymaga PyMuPDF i pytesseract "
+            "(pip install pymupdf pytesseract) "
+            f"oraz Tesseracta z danymi '{LOKALNY_JEZYK}'"
+        )
+        exit(1)
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Wysyłamy wszystkie zadania
-        future_to_zadanie = {executor.submit(przetworz_pdf, z): z for z in zadania}
+    print(f"=== Zbieranie plików do przetworzenia (silnik: {SILNIK_OCR}) ===")
+    zadania = zbierz_zadania()
 
-        # Odbieramy wyniki w miarę ich ukończenia
-        for future in as_completed(future_to_zadanie):
-            zadanie = future_to_zadanie[future]
-            try:
-                result = future.result()
-                with lock:
-                    if result["status"] == "ok":
-                        licznik_przetworzonych += 1
-                        print(
-                            f"  ✓ [{licznik_przetworzonych}/{len(zadania)}] {result['plik']}"
-                        )
-                    else:
-                        licznik_bledow += 1
-                        print(f"  ✗ {result['plik']}: {result['error']}")
-            except Exception as e:
-                with lock:
-                    licznik_bledow += 1
-                    print(f"  ✗ {zadanie['plik']}: {e}")
-
-print("\n=== Zakończono przetwarzanie ===")
-print(f"  Nowo przetworzonych: {licznik_przetworzonych}")
-print(f"  Pominiętych (już istniały): {licznik_pomietych}")
-print(f"  Błędów: {licznik_bledow}")
-print(f"Wyniki zapisane w: {folder_wyniki}")
+    zaoszczedzone_bajty = 0
+    bajty_upload = 0
+    czas_upload = 0.0
+    strony_zdalne = 0
+    strony_zdalne_bledy = 0
+    folder_tmp = tempfile.mkdtemp(prefix="ocr_kompresja_")
+
+    try:
+        if not zadania:
+            print("\n=== Brak nowych plików do przetworzenia ===")
+        else:
+            if SILNIK_OCR != "zdalny":
+                # Strony OCR-owane lokalnie w puli procesów (wszystkie rdzenie)
+                pula_ocr = ProcessPoolExecutor(max_workers=LOKALNY_PROCESY)
+            elif KOMPRESJA_PDF and fitz is None:
+                print(
+                    "\n⚠ Brak PyMuPDF (pip install pymupdf) - pomijam kompresję wstępną"
+                )
+            elif KOMPRESJA_PDF:
+                print(
+                    f"\n=== Kompresja wstępna {len(zadania)} plików ({KOMPRESJA_PROCESY} procesów) ==="
+                )
+                zaoszczedzone_bajty = kompresuj_zadania(zadania, folder_tmp)
+
+            # Najdłuższe zadania najpierw (LPT) - krótsze wypełniają końcówkę partii
+            harmonogram = utworz_harmonogram()
+            zadania = harmonogram.uporzadkuj(zadania)
+
+            print(
+                f"\n=== Rozpoczynam przetwarzanie {len(zadania)} plików ({MAX_WORKERS} równolegle) ==="
+            )
+            print(f"Szacowany czas: ~{formatuj_czas(harmonogram.eta())}")
+
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                # Wysyłamy wszystkie zadania w kolejności harmonogramu
+                future_to_zadanie = {
+                    executor.submit(harmonogram.uruchom, przetworz_pdf, z): z
+                    for z in zadania
+                }
+
+                # Odbieramy wyniki w miarę ich ukończenia
+                for future in as_completed(future_to_zadanie):
+                    zadanie = future_to_zadanie[future]
+                    try:
+                        result = future.result()
+                        harmonogram.zakonczono(zadanie, result["status"] == "ok")
+                        with lock:
+                            bajty_upload += result["bajty_upload"]
+                            czas_upload += result["czas_upload"]
+                            strony_zdalne += result["strony_zdalne"]
+                            strony_zdalne_bledy += result["strony_zdalne_bledy"]
+                            if result["status"] == "ok":
+                                licznik_przetworzonych += 1
+                                print(
+                                    f"  ✓ [{licznik_przetworzonych}/{len(zadania)}] {result['plik']}"
+                                    f" (pozostało ~{formatuj_czas(harmonogram.eta())})"
+                                )
+                            else:
+                                licznik_bledow += 1
+                                print(f"  ✗ {result['plik']}: {result['error']}")
+                    except Exception as e:
+                        harmonogram.zakonczono(zadanie, False)
+                        with lock:
+                            licznik_bledow += 1
+                            print(f"  ✗ {zadanie['plik']}: {e}")
+    finally:
+        if pula_ocr is not None:
+            pula_ocr.shutdown(cancel_futures=True)
+        shutil.rmtree(folder_tmp, ignore_errors=True)
+
+    print("\n=== Zakończono przetwarzanie ===")
+    print(f"  Nowo przetworzonych: {licznik_przetworzonych}")
+    print(f"  Pominiętych (już istniały): {licznik_pomietych}")
+    print(f"  Błędów: {licznik_bledow}")
+    if SILNIK_OCR == "hybrydowy":
+        print(f"  Stron przepisanych przez Gemini (niska pewność): {strony_zdalne}")
+        print(
+            f"  Stron nieprzepisanych (błąd Gemini, wynik lokalny): {strony_zdalne_bledy}"
+        )
+    if zaoszczedzone_bajty:
+        print(
+            f"  Zaoszczędzono przy uploadzie: {zaoszczedzone_bajty / 1024 / 1024:.1f} MB"
+        )
+        if bajty_upload and czas_upload:
+            # Szacunek na podstawie zmierzonej przepustowości uploadu
+            przepustowosc = bajty_upload / czas_upload
+            print(
+                f"  Skrócenie czasu uploadu: ~{zaoszczedzone_bajty / przepustowosc:.0f}s "
+                f"(łącznie {czas_upload:.0f}s zamiast ~{czas_upload + zaoszczedzone_bajty / przepustowosc:.0f}s)"
+            )
+    print(f"Wyniki zapisane w: {folder_wyniki}")
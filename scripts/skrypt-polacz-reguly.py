@@ -2,19 +2,31 @@
 """
 Skrypt do łączenia wszystkich reguł w jeden plik rules_database.json.
 Umożliwia wykluczenie wybranych wypadków z bazy.
+Każda reguła jest walidowana schematem RegulaWypadku (równolegle, w puli procesów).
 """
 
 import json
+import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Optional
 
+from magazyn_regul import PLIK_INDEKS, PLIK_NDJSON, zapisz_ndjson
+from modele_reguly import RegulaWypadku
+
 # =============================================================================
 # KONFIGURACJA
 # =============================================================================
 
 FOLDER_REGULY = Path("./reguly")
 PLIK_WYJSCIOWY = Path("./rules_database.json")
+PLIK_RAPORT_WALIDACJI = Path("./raport_walidacji.json")
+
+# Walidacja równoległa
+MAX_PROCESSES = os.cpu_count() or 1
+ROZMIAR_PACZKI = 16  # Liczba plików wysyłanych do procesu naraz (mniej IPC)
 
 # =============================================================================
 # LISTA WYKLUCZEŃ - EDYTUJ TĘ LISTĘ ABY USUNĄĆ WYBRANE WYPADKI
@@ -43,11 +55,33 @@ def wyodrebnij_numer(nazwa_pliku: str) -> Optional[int]:
     return None
 
 
-def wczytaj_reguly() -> list[dict]:
-    """Wczytuje wszystkie reguły z folderu, pomijając wykluczone."""
+def waliduj_plik(plik: Path) -> dict:
+    """
+    Waliduje plik reguły schematem RegulaWypadku - funkcja dla procesu.
+    Walidacja odbywa się bezpośrednio na surowych bajtach pliku (jedno
+    parsowanie), a do bazy trafia zwalidowany model. Czas jest mierzony
+    również dla plików niepoprawnych.
+    """
+    result = {"plik": plik.name, "data": None, "error": None, "czas_ms": 0.0}
+
+    start = time.perf_counter()
+    try:
+        raw = plik.read_bytes()
+        result["data"] = RegulaWypadku.model_validate_json(raw).model_dump()
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        result["czas_ms"] = (time.perf_counter() - start) * 1000
+
+    return result
+
+
+def wczytaj_reguly() -> tuple[list[dict], list[int], list[tuple], list[dict]]:
+    """Wczytuje i waliduje wszystkie reguły z folderu, pomijając wykluczone."""
     reguly = []
     pominięte = []
     błędy = []
+    do_walidacji = []
 
     # Pobierz wszystkie pliki JSON
     pliki = sorted(
@@ -68,25 +102,49 @@ def wczytaj_reguly() -> list[dict]:
             print(f"  ⏭ Pomijam (wykluczone): wypadek {numer}")
             continue
 
-        # Wczytaj plik
-        try:
-            with open(plik, "r", encoding="utf-8") as f:
-                data = json.load(f)
+        do_walidacji.append((numer, plik))
+
+    # Walidacja w puli procesów (kolejność wyników zgodna z kolejnością plików)
+    with ProcessPoolExecutor(max_workers=MAX_PROCESSES) as executor:
+        wyniki = list(
+            executor.map(
+                waliduj_plik,
+                [plik for _, plik in do_walidacji],
+                chunksize=ROZMIAR_PACZKI,
+            )
+        )
+
+    for (numer, plik), wynik in zip(do_walidacji, wyniki):
+        if wynik["error"] is not None:
+            błędy.append((numer, wynik["error"]))
+            pierwsza_linia = wynik["error"].splitlines()[0]
+            print(f"  ✗ Niepoprawna reguła w wypadku {numer}: {pierwsza_linia}")
+            continue
+
+        data = wynik["data"]
+
+        # Dodaj identyfikator wypadku do danych
+        data["_id_wypadku"] = numer
+        data["_plik_zrodlowy"] = plik.name
 
-            # Dodaj identyfikator wypadku do danych
-            data["_id_wypadku"] = numer
-            data["_plik_zrodlowy"] = plik.name
+        reguly.append(data)
 
-            reguly.append(data)
+    return reguly, pominięte, błędy, wyniki
 
-        except json.JSONDecodeError as e:
-            błędy.append((numer, str(e)))
-            print(f"  ✗ Błąd JSON w wypadku {numer}: {e}")
-        except Exception as e:
-            błędy.append((numer, str(e)))
-            print(f"  ✗ Błąd odczytu wypadku {numer}: {e}")
 
-    return reguly, pominięte, błędy
+def zapisz_raport_walidacji(wyniki: list[dict]):
+    """Zapisuje raport walidacji: niepoprawne pliki i czas walidacji każdego pliku."""
+    raport = {
+        "niepoprawne": [
+            {"plik": w["plik"], "blad": w["error"]}
+            for w in wyniki
+            if w["error"] is not None
+        ],
+        "czas_walidacji_ms": {w["plik"]: round(w["czas_ms"], 3) for w in wyniki},
+    }
+
+    with open(PLIK_RAPORT_WALIDACJI, "w", encoding="utf-8") as f:
+        json.dump(raport, f, ensure_ascii=False, indent=2)
 
 
 def generuj_statystyki(reguly: list[dict]) -> dict:
@@ -149,8 +207,9 @@ if __name__ == "__main__":
         print(f"⚠ Wykluczono {len(WYKLUCZONE)} wypadków: {WYKLUCZONE}")
         print()
 
-    print("=== Wczytywanie reguł ===")
-    reguly, pominięte, błędy = wczytaj_reguly()
+    print(f"=== Wczytywanie i walidacja reguł ({MAX_PROCESSES} procesów) ===")
+    reguly, pominięte, błędy, wyniki_walidacji = wczytaj_reguly()
+    zapisz_raport_walidacji(wyniki_walidacji)
 
     if not reguly:
         print("\n✗ Nie znaleziono żadnych reguł do połączenia!")
@@ -161,6 +220,7 @@ if __name__ == "__main__":
 
     print(f"\n=== Zapisywanie bazy ===")
     zapisz_baze(reguly, stats)
+    zapisz_ndjson(reguly, PLIK_NDJSON, PLIK_INDEKS)
 
     print()
     print("=" * 60)
@@ -169,6 +229,12 @@ if __name__ == "__main__":
     print(f"  Wczytanych reguł:    {len(reguly)}")
     print(f"  Wykluczonych:        {len(pominięte)}")
     print(f"  Błędów:              {len(błędy)}")
+    czasy = [w["czas_ms"] for w in wyniki_walidacji if w["error"] is None]
+    if czasy:
+        print(
+            f"  Walidacja (ms/plik): śr. {sum(czasy) / len(czasy):.2f}, maks. {max(czasy):.2f}"
+        )
+    print(f"  Raport walidacji:    {PLIK_RAPORT_WALIDACJI.absolute()}")
     print()
     print("  STATYSTYKI BAZY:")
     print(f"    Uznane:            {stats['uznane']}")
@@ -183,3 +249,5 @@ if __name__ == "__main__":
         print(f"    {ryz}: {liczba}")
     print()
     print(f"  Zapisano do: {PLIK_WYJSCIOWY.absolute()}")
+    print(f"  NDJSON:      {PLIK_NDJSON.absolute()}")
+    print(f"  Indeks:      {PLIK_INDEKS.absolute()}")
@@ -12,10 +12,13 @@ import time
 import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
-from typing import Literal, Optional
-from pydantic import BaseModel, Field, field_validator
+from typing import Optional
 from pathlib import Path
 
+from harmonogram import Harmonogram, formatuj_czas
+from modele_reguly import RegulaWypadku
+from szablony import SzablonKorpusu, szacuj_tokeny
+
 # =============================================================================
 # KONFIGURACJA
 # =============================================================================
@@ -33,104 +36,20 @@ MAX_WORKERS = 1  # Jeden wątek dla free tier (15 RPM limit)
 DELAY_BETWEEN_REQUESTS = 5  # Sekundy między requestami (rate limiting)
 MAX_RETRIES = 3  # Maksymalna liczba prób przy błędzie
 
+# Usuwanie tekstu szablonu formularzy (uczonego na całym korpusie) przed promptem
+USUWANIE_SZABLONU = True
+TYPY_Z_SZABLONEM = ("karta_wypadku", "zawiadomienie")
+
 # Thread-safe liczniki
 lock = Lock()
 licznik_przetworzonych = 0
 licznik_pomietych = 0
 licznik_bledow = 0
+tokeny_przed: dict[str, int] = {}
+tokeny_po: dict[str, int] = {}
 
-# =============================================================================
-# MODELE PYDANTIC - SCHEMAT REGUŁY
-# =============================================================================
-
-
-class MetaData(BaseModel):
-    """Metadane zdarzenia wypadkowego."""
-
-    data_zdarzenia: str = Field(..., description="Data w formacie YYYY-MM-DD")
-    godzina_zdarzenia: str = Field(..., description="Godzina w formacie HH:MM")
-    miejsce_zdarzenia: str = Field(
-        ..., description="Miejsce zdarzenia np. warsztat, biuro, droga do pracy"
-    )
-    rodzaj_urazu: str = Field(..., description="Rodzaj urazu z dokumentacji medycznej")
-
-    @field_validator("data_zdarzenia")
-    @classmethod
-    def validate_data(cls, v: str) -> str:
-        # Akceptuj różne formaty, ale preferuj YYYY-MM-DD
-        if v and v not in ["BRAK", "NIEZNANA", "brak", "nieznana"]:
-            # Próba normalizacji formatu
-            v = v.strip()
-        return v
-
-    @field_validator("godzina_zdarzenia")
-    @classmethod
-    def validate_godzina(cls, v: str) -> str:
-        if v and v not in ["BRAK", "NIEZNANA", "brak", "nieznana"]:
-            v = v.strip()
-        return v
-
-
-class AnalizaDecyzji(BaseModel):
-    """Analiza decyzji w sprawie wypadku."""
-
-    status: Literal["UZNANY", "NIEUZNANY"] = Field(
-        ..., description="Status decyzji: UZNANY lub NIEUZNANY"
-    )
-    powod_odrzucenia: str = Field(
-        ..., description="Powód odrzucenia (BRAK jeśli uznany)"
-    )
-    podstawa_prawna_cytat: str = Field(
-        ..., description="Dosłowny cytat z Opinii Prawnej uzasadniający decyzję"
-    )
-
-
-class RegulaEkspercka(BaseModel):
-    """Reguła ekspercka wyciągnięta z przypadku."""
-
-    warunek: str = Field(
-        ...,
-        description="Zwięzły opis okoliczności np. 'Upadek na śliskiej nawierzchni w miejscu pracy'",
-    )
-    logika: str = Field(
-        ...,
-        description="Logika w formacie: JEŚLI [okoliczności] ORAZ [warunek] TO [decyzja] PONIEWAŻ [uzasadnienie]",
-    )
-    kategoria_problemu: Literal[
-        "PRZYCZYNA_ZEWNETRZNA",
-        "NAGLOSC",
-        "ZWIAZEK_Z_PRACA",
-        "STAN_NIETRZEZWOSCI",
-        "INNE",
-    ] = Field(..., description="Kategoria problemu prawnego")
-
-
-class WnioskiDlaBota(BaseModel):
-    """Wnioski dla chatbota decyzyjnego."""
-
-    czego_szukac_w_przyszlosci: str = Field(
-        ...,
-        description="Wskazówka o co pytać w podobnych sprawach",
-    )
-    ryzyko_odrzucenia: Literal["NISKIE", "SREDNIE", "WYSOKIE"] = Field(
-        ..., description="Ocena ryzyka dla podobnych spraw"
-    )
-
-
-class RegulaWypadku(BaseModel):
-    """Kompletna reguła wypadku - główny model."""
-
-    meta_data: MetaData
-    analiza_decyzji: AnalizaDecyzji
-    fakty_kluczowe: list[str] = Field(
-        ..., min_length=1, description="Lista kluczowych faktów"
-    )
-    regula_ekspercka: RegulaEkspercka
-    wnioski_dla_bota: WnioskiDlaBota
-    brakujace_dokumenty: list[str] = Field(
-        default_factory=list, description="Lista brakujących dokumentów"
-    )
-
+# Szablon formularzy (ustawiany w głównej logice, tylko do odczytu w wątkach)
+szablon: Optional[SzablonKorpusu] = None
 
 # =============================================================================
 # FUNKCJE POMOCNICZE
@@ -286,7 +205,7 @@ def przetworz_wypadek(zadanie: dict) -> dict:
     numer = zadanie["numer"]
     sciezka_wyjscia = zadanie["sciezka_wyjscia"]
 
-    result = {"numer": numer, "status": "ok", "error": None}
+    result = {"numer": numer, "status": "ok", "error": None, "tokeny": {}}
 
     try:
         # 1. Znajdź i wczytaj dokumenty
@@ -300,6 +219,15 @@ def przetworz_wypadek(zadanie: dict) -> dict:
                 brakujace.append(nazwa)
             dokumenty_tresc[nazwa] = wczytaj_dokument(sciezka)
 
+        # Usuń powtarzalny tekst formularzy, zostawiając wypełnione pola
+        if szablon is not None:
+            for typ in TYPY_Z_SZABLONEM:
+                if dokumenty_sciezki.get(typ) is None:
+                    continue
+                przed = szacuj_tokeny(dokumenty_tresc[typ])
+                dokumenty_tresc[typ] = szablon.usun_szablon(dokumenty_tresc[typ], typ)
+                result["tokeny"][typ] = (przed, szacuj_tokeny(dokumenty_tresc[typ]))
+
         # 2. Zbuduj prompt
         prompt = zbuduj_prompt(dokumenty_tresc, brakujace)
 
@@ -365,6 +293,21 @@ def przetworz_wypadek(zadanie: dict) -> dict:
     return result
 
 
+def zbierz_dokumenty_korpusu() -> dict[str, list[Path]]:
+    """Zbiera ścieżki dokumentów z szablonem ze wszystkich folderów wyników OCR."""
+    korpus = {typ: [] for typ in TYPY_Z_SZABLONEM}
+
+    for folder in sorted(FOLDER_WYNIKI_TEKST.iterdir()):
+        if not folder.is_dir() or wyodrebnij_numer_wypadku(folder.name) is None:
+            continue
+        dokumenty = znajdz_dokumenty(folder)
+        for typ in TYPY_Z_SZABLONEM:
+            if dokumenty[typ] is not None:
+                korpus[typ].append(dokumenty[typ])
+
+    return korpus
+
+
 def zbierz_zadania() -> list[dict]:
     """Zbiera wszystkie wypadki do przetworzenia, pomijając już przetworzone."""
     global licznik_pomietych
@@ -398,6 +341,8 @@ def zbierz_zadania() -> list[dict]:
                 "folder": folder,
                 "numer": numer,
                 "sciezka_wyjscia": sciezka_wyjscia,
+                # Rozmiar tekstu dokumentów (bajty ≈ znaki) - podstawa szacowania kosztu
+                "rozmiar_tekstu": sum(p.stat().st_size for p in pliki),
             }
         )
 
@@ -421,10 +366,28 @@ if __name__ == "__main__":
         print("\n=== Brak nowych wypadków do przetworzenia ===")
         print(f"Pominięto: {licznik_pomietych}")
     else:
+        if USUWANIE_SZABLONU:
+            print("=== Aktualizacja szablonu formularzy ===")
+            szablon = SzablonKorpusu()
+            nowe = szablon.aktualizuj(zbierz_dokumenty_korpusu())
+            szablon.zapisz()
+            print(f"  Nowych dokumentów w szablonie: {nowe}")
+            print()
+
+        # Koszt szacowany z rozmiaru tekstu (model uczony na poprzednich
+        # uruchomieniach); najdłuższe zadania najpierw (LPT)
+        harmonogram = Harmonogram(
+            "reguly_znaki",
+            lambda z: z["rozmiar_tekstu"],
+            (DELAY_BETWEEN_REQUESTS + 5.0, 0.0005),
+            MAX_WORKERS,
+        )
+        zadania = harmonogram.uporzadkuj(zadania)
+
         print(
             f"\n=== Rozpoczynam przetwarzanie {len(zadania)} wypadków ({MAX_WORKERS} równolegle) ==="
         )
-        print(f"Szacowany czas: ~{len(zadania) * DELAY_BETWEEN_REQUESTS // 60} minut")
+        print(f"Szacowany czas: ~{formatuj_czas(harmonogram.eta())}")
         print()
 
         with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
@@ -432,7 +395,7 @@ if __name__ == "__main__":
             future_to_zadanie = {}
 
             for z in zadania:
-                future = executor.submit(przetworz_wypadek, z)
+                future = executor.submit(harmonogram.uruchom, przetworz_wypadek, z)
                 future_to_zadanie[future] = z
 
             # Odbieramy wyniki
@@ -440,11 +403,16 @@ if __name__ == "__main__":
                 zadanie = future_to_zadanie[future]
                 try:
                     result = future.result()
+                    harmonogram.zakonczono(zadanie, result["status"] == "ok")
                     with lock:
+                        for typ, (przed, po) in result["tokeny"].items():
+                            tokeny_przed[typ] = tokeny_przed.get(typ, 0) + przed
+                            tokeny_po[typ] = tokeny_po.get(typ, 0) + po
                         if result["status"] == "ok":
                             licznik_przetworzonych += 1
                             print(
                                 f"  ✓ [{licznik_przetworzonych}/{len(zadania)}] Wypadek {result['numer']}"
+                                f" (pozostało ~{formatuj_czas(harmonogram.eta())})"
                             )
                         else:
                             licznik_bledow += 1
@@ -452,6 +420,7 @@ if __name__ == "__main__":
                                 f"  ✗ Wypadek {result['numer']}: {result['error'][:100]}"
                             )
                 except Exception as e:
+                    harmonogram.zakonczono(zadanie, False)
                     with lock:
                         licznik_bledow += 1
                         print(f"  ✗ Wypadek {zadanie['numer']}: {e}")
@@ -464,3 +433,10 @@ if __name__ == "__main__":
         print(f"  Pominiętych:    {licznik_pomietych}")
         print(f"  Błędów:         {licznik_bledow}")
         print(f"  Wyniki w:       {FOLDER_REGULY.absolute()}")
+        if tokeny_przed:
+            print()
+            print("  TOKENY PO USUNIĘCIU SZABLONU (szacunkowo):")
+            for typ, przed in tokeny_przed.items():
+                po = tokeny_po[typ]
+                oszczednosc = 100 * (przed - po) / przed if przed else 0
+                print(f"    {typ}: {przed} → {po} (-{oszczednosc:.0f}%)")
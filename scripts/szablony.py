@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Usuwanie powtarzalnego tekstu szablonów formularzy (nagłówki, instrukcje,
+stopki prawne) z wyników OCR przed wysłaniem ich do modelu.
+
+Szablon uczony jest na całym korpusie wyniki_tekst osobno dla każdego typu
+dokumentu: linie oraz n-gramy słów występujące w dużej części dokumentów
+danego typu uznawane są za tekst formularza. Zliczenia są zapisywane
+w pliku cache i aktualizowane tylko o nowe dokumenty.
+"""
+
+import json
+from pathlib import Path
+
+PLIK_CACHE = Path("./.szablony_cache.json")
+WERSJA_CACHE = 2  # Zmiana sposobu zliczania unieważnia stary cache
+
+PROG_CZESTOSCI = 0.5  # Odsetek dokumentów, w których musi wystąpić element szablonu
+MIN_DOKUMENTOW = 5  # Poniżej tej liczby dokumentów danego typu nic nie usuwamy
+MIN_DLUGOSC_LINII = 12  # Krótsze linie (np. "TAK", "Data:") nigdy nie są usuwane
+N_GRAM = 5  # Długość n-gramów słów
+MIN_DLUGOSC_FRAZY = 10  # Minimalna liczba słów usuwanego fragmentu wewnątrz linii
+
+
+def normalizuj(linia: str) -> str:
+    """Sprowadza linię do postaci porównywalnej między dokumentami."""
+    return " ".join(linia.lower().split())
+
+
+def ngramy(slowa: list[str]) -> set[str]:
+    """Zwraca zbiór n-gramów (długości N_GRAM) z listy znormalizowanych słów."""
+    return {" ".join(slowa[i : i + N_GRAM]) for i in range(len(slowa) - N_GRAM + 1)}
+
+
+def szacuj_tokeny(tekst: str) -> int:
+    """Przybliżona liczba tokenów (~4 znaki na token)."""
+    return (len(tekst) + 3) // 4
+
+
+class SzablonKorpusu:
+    """Wyuczony szablon formularzy dla poszczególnych typów dokumentów."""
+
+    def __init__(self, plik_cache: Path = PLIK_CACHE):
+        self.plik_cache = plik_cache
+        self._typy: dict[str, dict] = {}
+        self._przetworzone: set[str] = set()
+        self._szablony: dict[str, tuple[set, set]] = {}
+
+        try:
+            with open(plik_cache, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache.get("wersja") != WERSJA_CACHE:
+                raise KeyError("wersja")
+            self._typy = cache["typy"]
+            self._przetworzone = set(cache["przetworzone"])
+        except (OSError, json.JSONDecodeError, KeyError):
+            pass
+
+    def zapisz(self):
+        """Zapisuje zliczenia do pliku cache."""
+        with open(self.plik_cache, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "wersja": WERSJA_CACHE,
+                    "typy": self._typy,
+                    "przetworzone": sorted(self._przetworzone),
+                },
+                f,
+                ensure_ascii=False,
+            )
+
+    def aktualizuj(self, dokumenty: dict[str, list[Path]]) -> int:
+        """
+        Dolicza do szablonu dokumenty, których jeszcze nie widział.
+        `dokumenty` mapuje typ dokumentu na listę ścieżek plików.
+        Zwraca liczbę nowych dokumentów.
+        """
+        nowe = 0
+
+        for typ, sciezki in dokumenty.items():
+            stats = self._typy.setdefault(
+                typ, {"dokumenty": 0, "linie": {}, "ngramy": {}}
+            )
+
+            for sciezka in sciezki:
+                klucz = str(sciezka)
+                if klucz in self._przetworzone:
+                    continue
+
+                try:
+                    tekst = sciezka.read_text(encoding="utf-8")
+                except Exception:
+                    continue
+
+                # Zliczamy także krótkie linie - nie są usuwane, ale ich
+                # częstość decyduje, czy są wypełnioną wartością
+                linie = {normalizuj(linia) for linia in tekst.splitlines()}
+                linie.discard("")
+                for linia in linie:
+                    stats["linie"][linia] = stats["linie"].get(linia, 0) + 1
+
+                for g in ngramy(normalizuj(tekst).split()):
+                    stats["ngramy"][g] = stats["ngramy"].get(g, 0) + 1
+
+                stats["dokumenty"] += 1
+                self._przetworzone.add(klucz)
+                nowe += 1
+
+            self._przytnij(stats)
+
+        self._szablony = {}
+        return nowe
+
+    def _przytnij(self, stats: dict):
+        """
+        Usuwa zliczenia zbyt rzadkie, by kiedykolwiek realnie przekroczyć próg.
+        Ogranicza rozmiar cache kosztem przybliżenia dla bardzo rzadkich elementów.
+        """
+        if stats["dokumenty"] < MIN_DOKUMENTOW * 4:
+            return
+        minimum = PROG_CZESTOSCI * stats["dokumenty"] / 4
+        for klucz in ("linie", "ngramy"):
+            stats[klucz] = {k: v for k, v in stats[klucz].items() if v >= minimum}
+
+    def _szablon(self, typ: str) -> tuple[set, set]:
+        """Zwraca (częste linie, n-gramy szablonu) dla typu dokumentu."""
+        if typ not in self._szablony:
+            stats = self._typy.get(typ)
+            if stats is None or stats["dokumenty"] < MIN_DOKUMENTOW:
+                self._szablony[typ] = (set(), set())
+            else:
+                prog = PROG_CZESTOSCI * stats["dokumenty"]
+                self._szablony[typ] = (
+                    {linia for linia, df in stats["linie"].items() if df >= prog},
+                    {g for g, df in stats["ngramy"].items() if df >= prog},
+                )
+        return self._szablony[typ]
+
+    def usun_szablon(self, tekst: str, typ: str) -> str:
+        """
+        Usuwa tekst formularza z dokumentu. Częsta linia (co najmniej
+        MIN_DLUGOSC_LINII znaków) zostaje tylko wtedy, gdy bezpośrednio po niej
+        jest wypełniona wartość: linia rzadka w korpusie albo krótka ("TAK",
+        "12.03.2024") - wtedy jest etykietą pola, z której i tak wycinane są
+        długie frazy szablonu. Krótkie linie nigdy nie są usuwane.
+        Z pozostałych linii wycinane są długie frazy złożone z n-gramów szablonu.
+        Puste linie są zachowywane, więc zmiana długości tekstu odpowiada
+        wyłącznie usuniętemu szablonowi.
+        """
+        linie_czeste, ngramy_szablonu = self._szablon(typ)
+        if not linie_czeste and not ngramy_szablonu:
+            return tekst
+
+        linie = tekst.splitlines()
+        znormalizowane = [normalizuj(linia) for linia in linie]
+        szablonowe = [
+            len(linia) >= MIN_DLUGOSC_LINII and linia in linie_czeste
+            for linia in znormalizowane
+        ]
+
+        # Indeks najbliższej niepustej linii po każdej linii
+        nastepna = [len(linie)] * len(linie)
+        for i in range(len(linie) - 2, -1, -1):
+            nastepna[i] = i + 1 if znormalizowane[i + 1] else nastepna[i + 1]
+
+        wynik = []
+        for i, linia in enumerate(linie):
+            if not znormalizowane[i]:
+                wynik.append(linia)
+                continue
+            if szablonowe[i]:
+                j = nastepna[i]
+                if j == len(linie) or szablonowe[j]:
+                    continue
+            bez_fraz = self._usun_frazy(linia, ngramy_szablonu)
+            if bez_fraz.strip():
+                wynik.append(bez_fraz)
+
+        return "\n".join(wynik) + ("\n" if tekst.endswith("\n") else "")
+
+    def _usun_frazy(self, linia: str, ngramy_szablonu: set) -> str:
+        """Wycina z linii ciągi co najmniej MIN_DLUGOSC_FRAZY słów pokryte n-gramami."""
+        slowa = linia.split()
+        if len(slowa) < MIN_DLUGOSC_FRAZY or not ngramy_szablonu:
+            return linia
+
+        znormalizowane = [s.lower() for s in slowa]
+        pokryte = [False] * len(slowa)
+        for i in range(len(slowa) - N_GRAM + 1):
+            if " ".join(znormalizowane[i : i + N_GRAM]) in ngramy_szablonu:
+                for j in range(i, i + N_GRAM):
+                    pokryte[j] = True
+        if not any(pokryte):
+            return linia
+
+        wynik = []
+        i = 0
+        while i < len(slowa):
+            j = i
+            while j < len(slowa) and pokryte[j] == pokryte[i]:
+                j += 1
+            if not (pokryte[i] and j - i >= MIN_DLUGOSC_FRAZY):
+                wynik.extend(slowa[i:j])
+            i = j
+
+        return " ".join(wynik)